@@ -3,25 +3,152 @@ IFC Alignment Viewer - Flask Web Application
 Allows uploading IFC files and visualizing alignments interactively
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_from_directory, session, abort
 import os
 import json
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+import plotly
+from cachetools import TTLCache
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
+from plotly.offline import get_plotlyjs_version
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from utils.ifc_processor import IFCProcessor
 from utils.visualizer import AlignmentVisualizer
 
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson, which also serializes NumPy types."""
+    
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+class SessionStore(TTLCache):
+    """Per-session state that deletes a session's uploads once it is dropped."""
+    
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for sid, _ in expired:
+            remove_session_uploads(sid)
+        return expired
+    
+    def popitem(self):
+        sid, state = super().popitem()
+        remove_session_uploads(sid)
+        return sid, state
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(32)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'output'
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['OUTPUT_MAX_AGE'] = 3600  # Output filenames carry their content version, so caching is safe
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['UPLOAD_CHUNK_SIZE'] = 1024 * 1024  # 1MB copy buffer
 app.config['ALLOWED_EXTENSIONS'] = {'ifc'}
+app.config['SESSION_TTL'] = 1800  # Idle sessions and their uploads are dropped after 30 minutes
+app.config['FILE_MAX_AGE'] = 24 * 3600  # Cache and output files are pruned after a day
+
+# Response compression (Brotli preferred, gzip fallback). Files sent with
+# send_from_directory are streamed and use the streaming algorithm list
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_ALGORITHM_STREAMING'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 2048
+# Re-check conditional GETs against the compressed ETag for streamed files
+app.config['COMPRESS_STREAMING_ENDPOINT_CONDITIONAL'] = ['static', 'serve_output', 'serve_data', 'serve_plotly_js']
+app.config['COMPRESS_MIMETYPES'] = [
+    'text/html',
+    'text/css',
+    'application/javascript',
+    'application/json',
+    'application/vnd.apache.arrow.file'
+]
+Compress(app)
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
+os.makedirs(app.config['CACHE_FOLDER'], exist_ok=True)
+
+# plotly.js bundle shipped with the installed plotly package
+PLOTLY_JS_FOLDER = os.path.join(os.path.dirname(plotly.__file__), 'package_data')
 
-# Store current session data
-session_data = {}
+# Parsed IFC processors per client session, keyed by session id
+session_store = SessionStore(maxsize=16, ttl=app.config['SESSION_TTL'])
+session_lock = threading.Lock()
+
+# Visualization files are written in the background; pending writes are
+# tracked by HTML filename so clients can poll /ready before loading them
+output_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+output_writes = TTLCache(maxsize=256, ttl=1800)
+output_lock = threading.Lock()
+
+
+def get_session_id():
+    """Get the id of the current client session, assigning one if needed."""
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+
+def get_session_processor(filepath):
+    """Get this session's IFCProcessor for filepath, or None if it has expired."""
+    sid = session.get('sid')
+    with session_lock:
+        state = session_store.get(sid)
+        if state:
+            # Re-inserting restarts the TTL, so active sessions are kept
+            session_store[sid] = state
+    if state and state['processor'].filepath == filepath:
+        return state['processor']
+    return None
+
+
+def remove_session_uploads(sid):
+    """Delete the upload folder of a session."""
+    shutil.rmtree(os.path.join(app.config['UPLOAD_FOLDER'], sid), ignore_errors=True)
+
+
+def prune_stale_files():
+    """Delete cache, output and orphaned upload files older than FILE_MAX_AGE."""
+    cutoff = time.time() - app.config['FILE_MAX_AGE']
+    for folder in (app.config['CACHE_FOLDER'], app.config['OUTPUT_FOLDER'], app.config['UPLOAD_FOLDER']):
+        for entry in os.scandir(folder):
+            if entry.name.startswith('.') or entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.is_dir():
+                # Upload folders of sessions lost e.g. to a restart
+                with session_lock:
+                    active = entry.name in session_store
+                if not active:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def get_current_file():
+    """Get the path of this session's uploaded file, or None if it is gone."""
+    filepath = session.get('current_file')
+    if filepath and os.path.exists(filepath):
+        return filepath
+    return None
 
 
 def allowed_file(filename):
@@ -50,19 +177,42 @@ def upload_file():
         return jsonify({'error': 'Invalid file type. Only .ifc files are allowed'}), 400
     
     try:
-        # Save the uploaded file
+        # Save the uploaded file under this session's own folder, so other
+        # clients uploading the same name never replace it
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], get_session_id())
+        os.makedirs(upload_folder, exist_ok=True)
+        filepath = os.path.join(upload_folder, filename)
+        
+        # Copy the request stream in 1MB chunks to a temporary name and move
+        # it into place, so a failed upload never truncates the previous file
+        tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as dest:
+                shutil.copyfileobj(file.stream, dest, app.config['UPLOAD_CHUNK_SIZE'])
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        # Only the latest upload of a session is kept
+        for entry in os.scandir(upload_folder):
+            if entry.path != filepath and not entry.name.endswith('.tmp'):
+                os.remove(entry.path)
+        prune_stale_files()
         
         # Process the IFC file to extract alignments
         processor = IFCProcessor(filepath)
         alignments = processor.get_alignments()
         
         # Store in session
-        session_data['current_file'] = filepath
-        session_data['filename'] = filename
-        session_data['alignments'] = alignments
+        session['current_file'] = filepath
+        session['filename'] = filename
+        with session_lock:
+            session_store[get_session_id()] = {
+                'processor': processor,
+                'alignments': alignments
+            }
         
         return jsonify({
             'success': True,
@@ -77,21 +227,34 @@ def upload_file():
 @app.route('/visualize/<alignment_id>', methods=['GET'])
 def visualize_alignment(alignment_id):
     """Generate visualization for a specific alignment."""
-    if 'current_file' not in session_data:
-        return jsonify({'error': 'No file uploaded'}), 400
+    filepath = get_current_file()
+    if filepath is None:
+        return jsonify({'error': 'No file uploaded, or the upload has expired'}), 400
     
     try:
-        filepath = session_data['current_file']
         
-        # Create visualizer
-        visualizer = AlignmentVisualizer(filepath)
+        # Reuse the model parsed for this session when it is still cached
+        processor = get_session_processor(filepath) or IFCProcessor(filepath)
+        
+        # Create visualizer, keyed by the file version the model came from
+        visualizer = AlignmentVisualizer(filepath, ifc_file=processor.ifc_file, mtime=processor.ifc_mtime)
         
         # Generate visualization and analysis
-        result = visualizer.create_visualization(alignment_id, app.config['OUTPUT_FOLDER'])
+        result = visualizer.create_visualization(alignment_id, app.config['OUTPUT_FOLDER'],
+                                                 cache_folder=app.config['CACHE_FOLDER'],
+                                                 executor=output_executor)
+        
+        # Respond now; the browser polls /ready until the files are written
+        write_future = result['write_future']
+        with output_lock:
+            output_writes[result['html_filename']] = write_future
         
         return jsonify({
             'success': True,
+            'ready': write_future.done(),
             'html_path': result['html_filename'],
+            'data_path': result['data_filename'],
+            'version': result['version'],
             'summary': result['summary'],
             'base_segments': result['base_segments'],
             'vertical_segments': result['vertical_segments']
@@ -102,19 +265,91 @@ def visualize_alignment(alignment_id):
         return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
 
 
+@app.route('/preview_all', methods=['GET'])
+def preview_all():
+    """Generate visualizations for every complete alignment in parallel."""
+    filepath = get_current_file()
+    if filepath is None:
+        return jsonify({'error': 'No file uploaded, or the upload has expired'}), 400
+    
+    try:
+        processor = get_session_processor(filepath) or IFCProcessor(filepath)
+        alignment_ids = [a['id'] for a in processor.get_alignments() if a['is_complete']]
+        visualizer = AlignmentVisualizer(filepath, ifc_file=processor.ifc_file, mtime=processor.ifc_mtime)
+        
+        def render(alignment_id):
+            return visualizer.create_visualization(alignment_id, app.config['OUTPUT_FOLDER'],
+                                                   cache_folder=app.config['CACHE_FOLDER'])
+        
+        previews = []
+        errors = []
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = [(alignment_id, executor.submit(render, alignment_id)) for alignment_id in alignment_ids]
+            for alignment_id, future in futures:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append({'alignment_id': alignment_id, 'error': str(e)})
+                    continue
+                previews.append({
+                    'alignment_id': alignment_id,
+                    'html_path': result['html_filename'],
+                    'data_path': result['data_filename'],
+                    'version': result['version'],
+                    'summary': result['summary']
+                })
+        
+        return jsonify({
+            'success': True,
+            'previews': previews,
+            'errors': errors
+        })
+    
+    except Exception as e:
+        import traceback
+        return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
+
+
+@app.route('/ready/<filename>')
+def output_ready(filename):
+    """Report whether a visualization's output files have been written."""
+    with output_lock:
+        write_future = output_writes.get(filename)
+    
+    if write_future is None:
+        # No pending write (or it has expired): ready if the file is on disk
+        path = safe_join(app.config['OUTPUT_FOLDER'], filename)
+        return jsonify({'ready': path is not None and os.path.isfile(path)})
+    
+    if write_future.done() and write_future.exception() is not None:
+        return jsonify({'ready': False, 'error': str(write_future.exception())}), 500
+    
+    return jsonify({'ready': write_future.done()})
+
+
 @app.route('/output/<filename>')
 def serve_output(filename):
     """Serve generated visualization files."""
-    return send_file(os.path.join(app.config['OUTPUT_FOLDER'], filename))
+    return send_from_directory(app.config['OUTPUT_FOLDER'], filename,
+                               conditional=True, max_age=app.config['OUTPUT_MAX_AGE'])
+
+
+@app.route('/data/<filename>')
+def serve_data(filename):
+    """Serve the Arrow data file behind a visualization."""
+    return send_from_directory(app.config['OUTPUT_FOLDER'], filename,
+                               mimetype='application/vnd.apache.arrow.file',
+                               conditional=True, max_age=app.config['OUTPUT_MAX_AGE'])
 
 
-@app.route('/get_visualization/<filename>')
-def get_visualization(filename):
-    """Get the visualization HTML content."""
-    filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    return content
+@app.route('/vendor/plotly-<version>.min.js')
+def serve_plotly_js(version):
+    """Serve the plotly.js bundle that visualization pages load."""
+    if version != get_plotlyjs_version():
+        abort(404)
+    return send_from_directory(PLOTLY_JS_FOLDER, 'plotly.min.js',
+                               mimetype='application/javascript',
+                               conditional=True, max_age=app.config['OUTPUT_MAX_AGE'])
 
 
 if __name__ == '__main__':
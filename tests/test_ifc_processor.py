@@ -0,0 +1,90 @@
+"""
+Tests for the STEP text scan behind IFCProcessor.get_alignments
+"""
+
+import pytest
+
+from utils.ifc_processor import (IFCProcessor, _decode_step_string, _iter_step_instances,
+                                 _parse_step_args, _scan_alignments)
+
+
+# Two instances per line, a statement wrapped over lines, a forward
+# reference, a comment and a string that both look like instances
+STEP_TEXT = r"""ISO-10303-21;
+HEADER;
+FILE_DESCRIPTION(('ViewDefinition [Alignment]'),'2;1');
+FILE_NAME('mini.ifc','2024-01-01T00:00:00',(''),(''),'','','');
+FILE_SCHEMA(('IFC4X3_ADD2'));
+ENDSEC;
+DATA;
+#1=IFCGEOMETRICREPRESENTATIONCONTEXT($,'Model',3,1.E-05,$,$); #2=IFCCARTESIANPOINT((0.,0.));
+#3=IFCPOLYLINE((#2,
+  #2));
+#10=IFCSHAPEREPRESENTATION(#1,'Axis','Curve2D',(#3)); #11=IFCSHAPEREPRESENTATION(#1,'Axis','Curve3D',(#3));
+#12=IFCPRODUCTDEFINITIONSHAPE($,$,(#10,#11)); /* #13=IFCALIGNMENT('x'; not real */ #20=IFCALIGNMENT('0NgtFk1uH6Ixc3NIKH1GHa',$,'Caf\X2\00E9\X0\ ''A''; #99=IFCALIGNMENT(',$,$,$,#12,.USERDEFINED.);
+#21=IFCALIGNMENT('1NgtFk1uH6Ixc3NIKH1GHa',$,$,
+  'Base only',$,$,#22,*); #22=IFCPRODUCTDEFINITIONSHAPE($,$,(#10));
+ENDSEC;
+END-ISO-10303-21;"""
+
+
+@pytest.fixture
+def step_file(tmp_path):
+    path = tmp_path / 'mini.ifc'
+    path.write_text(STEP_TEXT, encoding='utf-8')
+    return str(path)
+
+
+def test_parse_step_args():
+    args = _parse_step_args("(#1,'a''b',$,*,.USERDEFINED.,(1.,-2.5E-1),IFCLABEL('x'),())")
+    assert args == [1, "a'b", None, None, 'USERDEFINED', [1.0, -0.25], 'x', []]
+
+
+def test_parse_step_args_from_position():
+    assert _parse_step_args("#5=IFCLINE(#6,#7);", 10) == [6, 7]
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ("Caf\\X2\\00E9\\X0\\", "Caf\u00e9"),
+    ("\\X2\\03B103B2\\X0\\", "\u03b1\u03b2"),
+    ("\\X4\\0001F600\\X0\\", "\U0001f600"),
+    ("\\X\\E9", "\u00e9"),
+    ("\\S\\i", "\u00e9"),
+    ("it''s", "it's"),
+    ("a\\\\b", "a\\b"),
+])
+def test_decode_step_string(raw, expected):
+    assert _decode_step_string(raw) == expected
+
+
+def test_iter_step_instances(step_file):
+    instances = {step_id: (entity, args) for step_id, entity, args in _iter_step_instances(step_file)}
+    
+    assert sorted(instances) == [10, 11, 12, 20, 21, 22]
+    assert instances[12] == ('IFCPRODUCTDEFINITIONSHAPE', [None, None, [10, 11]])
+    assert instances[20][1][2] == "Caf\u00e9 'A'; #99=IFCALIGNMENT("
+    assert instances[21][1][-1] is None
+
+
+def test_iter_step_instances_rejects_other_files(tmp_path):
+    path = tmp_path / 'not.ifc'
+    path.write_text('<xml/>')
+    with pytest.raises(ValueError):
+        list(_iter_step_instances(str(path)))
+
+
+def test_scan_matches_model(step_file):
+    scanned = _scan_alignments(step_file, 0)
+    
+    assert [a['id'] for a in scanned] == [20, 21]
+    assert [a['is_complete'] for a in scanned] == [True, False]
+    assert scanned == IFCProcessor(step_file)._get_alignments_from_model()
+
+
+def test_scan_rejects_dangling_reference(tmp_path):
+    # An instance the scan cannot see must not silently yield a partial list
+    path = tmp_path / 'dangling.ifc'
+    path.write_text(STEP_TEXT.replace("#12=IFCPRODUCTDEFINITIONSHAPE", "#12=IFCPRODUCTDEFINITION"))
+    
+    with pytest.raises(ValueError):
+        _scan_alignments(str(path), 0)
@@ -0,0 +1,134 @@
+"""
+Tests for the numeric kernels and output files of the visualizer
+"""
+
+import json
+import re
+
+import numpy as np
+import plotly.graph_objects as go
+import pyarrow.feather as feather
+import pytest
+
+from utils.visualizer import AlignmentVisualizer, _build_3d, _rdp_mask
+
+
+@pytest.mark.parametrize('vert_distances, elevations', [
+    ([0.0, 100.0, 200.0], [0.0, 1.0, 3.0]),
+    # A step at a segment boundary repeats its station
+    ([0.0, 100.0, 100.0, 200.0], [0.0, 1.0, 5.0, 6.0]),
+    # Repeated stations at both ends of the profile
+    ([0.0, 0.0, 50.0, 100.0, 100.0], [2.0, 4.0, 5.0, 7.0, 9.0]),
+])
+def test_build_3d_matches_interp(vert_distances, elevations):
+    vert_distances = np.array(vert_distances)
+    elevations = np.array(elevations)
+    # Stations before, at, between and beyond the profile samples
+    base_distances = np.sort(np.concatenate([vert_distances, np.linspace(-20.0, 220.0, 49)]))
+    
+    result = _build_3d(base_distances, vert_distances, elevations)
+    
+    np.testing.assert_allclose(result, np.interp(base_distances, vert_distances, elevations))
+
+
+def test_build_3d_repeated_station_takes_later_value():
+    result = _build_3d(np.array([100.0]), np.array([0.0, 100.0, 100.0, 200.0]), np.array([0.0, 1.0, 5.0, 6.0]))
+    assert result[0] == 5.0
+
+
+def test_build_3d_clamps_outside_profile():
+    result = _build_3d(np.array([-5.0, 500.0]), np.array([0.0, 100.0]), np.array([3.0, 8.0]))
+    np.testing.assert_array_equal(result, [3.0, 8.0])
+
+
+def test_build_3d_random_profiles():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        count = rng.integers(2, 12)
+        # Integer stations make repeated values likely
+        vert_distances = np.sort(rng.integers(0, 8, count).astype(float))
+        elevations = rng.normal(size=count)
+        base_distances = np.sort(np.concatenate([rng.integers(-1, 9, 6).astype(float), rng.uniform(-1.0, 9.0, 6)]))
+        
+        np.testing.assert_allclose(_build_3d(base_distances, vert_distances, elevations),
+                                   np.interp(base_distances, vert_distances, elevations))
+
+
+def test_build_3d_unsorted_falls_back_to_interp():
+    base_distances = np.array([150.0, 10.0, 60.0])
+    vert_distances = np.array([0.0, 100.0, 200.0])
+    elevations = np.array([0.0, 10.0, 0.0])
+    np.testing.assert_allclose(_build_3d(base_distances, vert_distances, elevations),
+                               np.interp(base_distances, vert_distances, elevations))
+
+
+def _polyline_deviation(points, mask):
+    """Largest distance of any point from the simplified polyline through the kept points."""
+    kept = np.flatnonzero(mask)
+    worst = 0.0
+    for start, end in zip(kept[:-1], kept[1:]):
+        chord = points[end] - points[start]
+        rel = points[start:end + 1] - points[start]
+        t = np.clip(rel @ chord / (chord @ chord), 0.0, 1.0)
+        worst = max(worst, np.linalg.norm(rel - t[:, None] * chord, axis=1).max())
+    return worst
+
+
+@pytest.mark.parametrize('epsilon', [0.01, 0.1, 1.0])
+def test_rdp_mask_keeps_endpoints_within_epsilon(epsilon):
+    angles = np.linspace(0.0, np.pi, 400)
+    arc = np.column_stack([100.0 * np.cos(angles), 100.0 * np.sin(angles), np.linspace(0.0, 5.0, 400)])
+    line = np.column_stack([np.linspace(-100.0, -300.0, 200), np.zeros(200), np.full(200, 5.0)])
+    points = np.vstack([arc, line])
+    
+    mask = _rdp_mask(points, epsilon)
+    
+    assert mask[0] and mask[-1]
+    assert mask.sum() < len(points)
+    assert _polyline_deviation(points, mask) <= epsilon
+
+
+def test_rdp_mask_keeps_corners_and_disables_at_zero():
+    points = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [2.0, 1.0], [2.0, 2.0]])
+    
+    np.testing.assert_array_equal(_rdp_mask(points, 0.1), [True, False, True, False, True])
+    assert _rdp_mask(points, 0.0).all()
+
+
+def test_write_outputs_layout_matches_arrow_file(tmp_path):
+    rng = np.random.default_rng(0)
+    x3, y3, z3 = rng.normal(size=(3, 1500))
+    fig = go.Figure([
+        go.Scatter(x=rng.normal(size=40), y=rng.normal(size=40)),
+        go.Table(header={'values': ['A']}, cells={'values': [[1]]}),
+        go.Scattergl(x=rng.normal(size=2000), y=rng.normal(size=2000)),
+        go.Scatter3d(x=x3, y=y3, z=z3, line={'color': z3}),
+    ])
+    expected = {0: {'x': fig.data[0].x, 'y': fig.data[0].y},
+                2: {'x': fig.data[2].x, 'y': fig.data[2].y},
+                3: {'x': x3, 'y': y3, 'z': z3}}
+    html_path = tmp_path / 'plot.html'
+    data_path = tmp_path / 'plot.arrow'
+    
+    # _write_outputs does not touch the IFC model, so skip opening one
+    visualizer = object.__new__(AlignmentVisualizer)
+    visualizer._write_outputs(fig, 'Plot', str(html_path), str(data_path), '/data/plot.arrow')
+    
+    page = html_path.read_text(encoding='utf-8')
+    layout = json.loads(re.search(r'const layout = (.*);', page).group(1))
+    slices = json.loads(re.search(r'const slices = (.*);', page).group(1))
+    data = data_path.read_bytes()
+    table = feather.read_table(str(data_path))
+    
+    # Decode exactly as the page does: float64 views at the recorded offsets
+    columns = {}
+    for name, column in layout.items():
+        assert column['offset'] % 8 == 0
+        columns[name] = np.frombuffer(data, dtype='<f8', count=column['length'], offset=column['offset'])
+        np.testing.assert_array_equal(columns[name], table.column(name).to_numpy())
+    
+    assert {s['trace'] for s in slices} == {0, 2, 3}
+    for s in slices:
+        for field in s['fields']:
+            np.testing.assert_array_equal(columns[field][s['start']:s['stop']], expected[s['trace']][field])
+    assert [s['color'] for s in slices] == [None, None, 'z']
@@ -2,22 +2,245 @@
 IFC Processor - Extract alignment information from IFC files
 """
 
+import functools
+import os
+import re
+
 import ifcopenshell
 
 
+# Only the entities needed for alignment metadata are decoded by the scan.
+# Instances are anchored on the ';' ending the previous statement, so they
+# may share a line or span several.
+_SCAN_RE = re.compile(
+    r";\s*#(\d+)\s*=\s*(IFCALIGNMENT|IFCPRODUCTDEFINITIONSHAPE|IFCSHAPEREPRESENTATION)\s*\(",
+    re.IGNORECASE
+)
+
+_COMMENT_RE = re.compile(r"('[^']*')|/\*.*?\*/", re.DOTALL)
+
+_TOKEN_RE = re.compile(r"""
+    '(?:[^']|'')*'          # string
+  | \#\d+                   # entity reference
+  | \.[A-Z0-9_]+\.          # enumeration
+  | [A-Z][A-Z0-9_]*\s*\(    # typed value, e.g. IFCLABEL(
+  | [-+0-9.E]+              # number
+  | [$*(),]
+""", re.VERBOSE | re.IGNORECASE)
+
+_ESCAPE_RE = re.compile(
+    r"\\X2\\((?:[0-9A-F]{4})+)\\X0\\|\\X4\\((?:[0-9A-F]{8})+)\\X0\\|\\X\\([0-9A-F]{2})|\\S\\(.)|\\P[A-I]\\",
+    re.IGNORECASE
+)
+
+
+def _decode_step_string(raw):
+    """Decode the escape sequences of an ISO 10303-21 string."""
+    def replace(match):
+        if match.group(1):
+            return bytes.fromhex(match.group(1)).decode('utf-16-be')
+        if match.group(2):
+            return bytes.fromhex(match.group(2)).decode('utf-32-be')
+        if match.group(3):
+            return chr(int(match.group(3), 16))
+        if match.group(4):
+            return chr(ord(match.group(4)) + 128)
+        return ''
+    
+    return _ESCAPE_RE.sub(replace, raw.replace("''", "'")).replace('\\\\', '\\')
+
+
+def _parse_step_args(text, pos=0):
+    """Parse the parenthesised STEP attribute list starting at pos.
+    
+    References become ints, strings and enumerations become str, unset
+    values become None and nested aggregates become lists.
+    """
+    stack = [(False, [])]
+    
+    for match in _TOKEN_RE.finditer(text, pos):
+        token = match.group()
+        values = stack[-1][1]
+        
+        if token[0] == "'":
+            values.append(_decode_step_string(token[1:-1]))
+        elif token[0] == '#':
+            values.append(int(token[1:]))
+        elif token in ('$', '*'):
+            values.append(None)
+        elif token == ',':
+            continue
+        elif token.endswith('('):
+            stack.append((token != '(', []))
+        elif token == ')':
+            typed, inner = stack.pop()
+            if typed:
+                stack[-1][1].append(inner[0] if inner else None)
+            else:
+                stack[-1][1].append(inner)
+            if len(stack) == 1:
+                break
+        elif len(token) > 2 and token[0] == '.' and token[-1] == '.':
+            values.append(token[1:-1])
+        else:
+            values.append(float(token))
+    
+    return stack[0][1][0]
+
+
+def _strip_step_comments(text):
+    """Replace the comments outside strings with a space."""
+    return _COMMENT_RE.sub(lambda match: match.group(1) or ' ', text)
+
+
+def _iter_step_instances(filepath):
+    """Yield (id, type, attributes) for the alignment-related entities.
+    
+    Instances are located with a single regex over the whole text, so
+    entities that are not needed are never tokenised.
+    """
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    
+    if not text[:64].lstrip().upper().startswith('ISO-10303-21'):
+        raise ValueError("Not an ISO 10303-21 (STEP) file")
+    
+    # Comments may hide quotes or separators
+    if '/*' in text:
+        text = _strip_step_comments(text)
+    
+    quotes = 0
+    last = 0
+    for match in _SCAN_RE.finditer(text):
+        # Quotes pair up even when escaped as '', so an odd count before
+        # the match means it lies inside a string
+        quotes += text.count("'", last, match.start())
+        last = match.start()
+        if quotes % 2:
+            continue
+        
+        args = _parse_step_args(text, match.end() - 1)
+        yield int(match.group(1)), match.group(2).upper(), args
+
+
+@functools.lru_cache(maxsize=4)
+def _scan_alignments(filepath, mtime):
+    """Collect alignment metadata without building the full IFC model."""
+    alignments = {}
+    shapes = {}
+    representation_types = {}
+    
+    for step_id, entity, args in _iter_step_instances(filepath):
+        if entity == 'IFCALIGNMENT':
+            alignments[step_id] = args
+        elif entity == 'IFCPRODUCTDEFINITIONSHAPE':
+            shapes[step_id] = args[2] or []
+        else:
+            representation_types[step_id] = args[2]
+    
+    result = []
+    for step_id in sorted(alignments):
+        args = alignments[step_id]
+        shape_id = args[6]
+        
+        # A dangling reference means the scan misread the file; let the
+        # caller fall back to the full model instead of guessing
+        if shape_id is not None and shape_id not in shapes:
+            raise ValueError(f"Shape #{shape_id} of alignment #{step_id} not found by scan")
+        rep_ids = shapes.get(shape_id, [])
+        if any(ref not in representation_types for ref in rep_ids):
+            raise ValueError(f"Representation of alignment #{step_id} not found by scan")
+        rep_types = {representation_types[ref] for ref in rep_ids}
+        
+        alignment_info = {
+            'id': step_id,
+            'global_id': args[0],
+            'name': args[2] if args[2] else f"Alignment {step_id}",
+            'description': args[3] if args[3] else "",
+            'type': args[-1],
+            'has_base_curve': 'Curve2D' in rep_types,
+            'has_gradient_curve': 'Curve3D' in rep_types
+        }
+        alignment_info['is_complete'] = alignment_info['has_base_curve'] and alignment_info['has_gradient_curve']
+        
+        result.append(alignment_info)
+    
+    return result
+
+
+@functools.lru_cache(maxsize=4)
+def _open_ifc(filepath, mtime):
+    """Parse an IFC file. Cached per (path, mtime) so re-uploads invalidate."""
+    return ifcopenshell.open(filepath)
+
+
+def open_ifc(filepath):
+    """Open an IFC file, reusing the parsed model while the file is unchanged.
+    
+    Returns (model, mtime), where mtime identifies the file version the
+    model was parsed from.
+    """
+    filepath = os.path.abspath(filepath)
+    while True:
+        mtime = os.path.getmtime(filepath)
+        model = _open_ifc(filepath, mtime)
+        # Parse again if the file was replaced while it was being read
+        if os.path.getmtime(filepath) == mtime:
+            return model, mtime
+        _open_ifc.cache_clear()
+
+
 class IFCProcessor:
     """Process IFC files to extract alignment information."""
     
     def __init__(self, filepath):
         """Initialize with IFC file path."""
         self.filepath = filepath
-        self.ifc_file = ifcopenshell.open(filepath)
+        self._ifc_file = None
+        self._ifc_mtime = None
+        self._alignments = None
+    
+    def _load_model(self):
+        """Parse the full IFC model on first use."""
+        if self._ifc_file is None:
+            self._ifc_file, self._ifc_mtime = open_ifc(self.filepath)
+    
+    @property
+    def ifc_file(self):
+        """Full IFC model, parsed on first access."""
+        self._load_model()
+        return self._ifc_file
+    
+    @property
+    def ifc_mtime(self):
+        """Modification time of the file version ifc_file was parsed from."""
+        self._load_model()
+        return self._ifc_mtime
+    
+    def _alignment_entities(self):
+        """Get the IfcAlignment entities, scanning the file only once."""
+        if self._alignments is None:
+            self._alignments = self.ifc_file.by_type('IfcAlignment')
+        return self._alignments
     
     def get_alignments(self):
-        """Get all alignments from the IFC file."""
+        """Get all alignments from the IFC file.
+        
+        Uses a lightweight scan of the STEP text so the full model is only
+        parsed once segment geometry is needed.
+        """
+        try:
+            filepath = os.path.abspath(self.filepath)
+            scanned = _scan_alignments(filepath, os.path.getmtime(filepath))
+            return [dict(info) for info in scanned]
+        except (ValueError, IndexError, TypeError, UnicodeDecodeError):
+            return self._get_alignments_from_model()
+    
+    def _get_alignments_from_model(self):
+        """Get all alignments by walking the fully parsed IFC model."""
         alignments = []
         
-        for alignment in self.ifc_file.by_type('IfcAlignment'):
+        for alignment in self._alignment_entities():
             # Get basic info
             alignment_info = {
                 'id': alignment.id(),
@@ -48,7 +271,7 @@ class IFCProcessor:
     
     def get_alignment_by_global_id(self, global_id):
         """Get a specific alignment by its GlobalId."""
-        for alignment in self.ifc_file.by_type('IfcAlignment'):
+        for alignment in self._alignment_entities():
             if alignment.GlobalId == global_id:
                 return alignment
         return None
@@ -2,275 +2,637 @@
 Alignment Visualizer - Create interactive visualizations for IFC alignments
 """
 
-import ifcopenshell
 import numpy as np
 import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs_version
 from plotly.subplots import make_subplots
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from numba import njit
+import hashlib
+import html
+import json
 import os
+import threading
+import uuid
+from string import Template
+from urllib.parse import quote
+
+from .ifc_processor import open_ifc
+
+
+# Bump when evaluation output changes so stale cache entries are ignored
+_CACHE_VERSION = 4
+_CACHED_ARRAYS = ('base_points', 'base_distances', 'vert_distances', 'elevations', 'base_elevations')
+_CACHED_FRAMES = ('base_df', 'vert_df', 'summary_df')
+
+# ifcopenshell models are not safe for concurrent access; all entity reads
+# happen under this lock and the numeric work runs outside it
+_ifc_lock = threading.Lock()
+
+# Adaptive sampling: at most SAMPLING_STEP metres between samples along a
+# segment, at most ANGLE_STEP radians of turn between samples on an arc, and
+# at most PROFILE_TOLERANCE metres chord error on vertical polynomials
+_SAMPLING_STEP = 10.0
+_ANGLE_STEP = 0.01
+_PROFILE_TOLERANCE = 0.005
+_MIN_CURVE_POINTS = 8
+
+# Above this many points 2D traces are rendered with WebGL instead of SVG
+_WEBGL_POINT_THRESHOLD = 1000
+
+_POINT_TRACE_TYPES = ('scatter', 'scattergl', 'scatter3d')
+
+# Small HTML shell: trace coordinates are fetched as Arrow and attached
+# client-side. Scripts come from the app itself, so the viewer works offline.
+# The Arrow file holds one uncompressed record batch of float64 columns, so
+# the page views the column buffers directly at the offsets recorded here
+# instead of loading an Arrow library.
+_HTML_SHELL = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>$title</title>
+    <script src="/vendor/plotly-$plotly_version.min.js"></script>
+    <style>html, body { margin: 0; } #plot { width: 100%; }</style>
+</head>
+<body>
+    <div id="plot"></div>
+    <script>
+        (async function () {
+            const figure = $figure_json;
+            const slices = $slices_json;
+            const layout = $layout_json;
+            const buffer = await (await fetch($data_url)).arrayBuffer();
+            const columns = {};
+            for (const [name, column] of Object.entries(layout)) {
+                columns[name] = new Float64Array(buffer, column.offset, column.length);
+            }
+            for (const slice of slices) {
+                const trace = figure.data[slice.trace];
+                for (const field of slice.fields) {
+                    trace[field] = columns[field].subarray(slice.start, slice.stop);
+                }
+                if (slice.color) {
+                    trace.line.color = columns[slice.color].subarray(slice.start, slice.stop);
+                }
+            }
+            Plotly.newPlot('plot', figure.data, figure.layout, {responsive: true});
+        })();
+    </script>
+</body>
+</html>
+""")
+
+
+def _write_atomic(path, write, mode='wb', **kwargs):
+    """Write a file under a unique temporary name and move it into place.
+    
+    Concurrent writers of one path never see or remove each other's
+    partial files; a failed write leaves the previous file untouched.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@njit(cache=True)
+def _build_3d(base_distances, vert_distances, elevations):
+    """Interpolate profile elevations at the base curve stations.
+    
+    Both inputs are non-decreasing, so instead of a binary search per
+    station (np.interp) the profile index only ever walks forward; each
+    station is then a linear blend of the bracketing profile samples.
+    Like np.interp, a repeated station (a step at a segment boundary)
+    takes the later value and stations outside the profile are clamped
+    to its end elevations. Unsorted input falls back to np.interp.
+    """
+    n = len(vert_distances)
+    if (n < 2 or np.any(base_distances[1:] < base_distances[:-1])
+            or np.any(vert_distances[1:] < vert_distances[:-1])):
+        return np.interp(base_distances, vert_distances, elevations)
+    
+    first = vert_distances[0]
+    last = vert_distances[n - 1]
+    result = np.empty(len(base_distances))
+    idx = 1
+    for i in range(len(base_distances)):
+        distance = base_distances[i]
+        if distance >= last:
+            result[i] = elevations[n - 1]
+            continue
+        if distance < first:
+            result[i] = elevations[0]
+            continue
+        # Advance to the first profile sample beyond this station
+        while vert_distances[idx] <= distance:
+            idx += 1
+        x0 = vert_distances[idx - 1]
+        t = (distance - x0) / (vert_distances[idx] - x0)
+        result[i] = elevations[idx - 1] + t * (elevations[idx] - elevations[idx - 1])
+    return result
+
+
+@njit(cache=True)
+def _range_mask(values, lower, upper):
+    """Boolean mask of values within [lower, upper]."""
+    return (values >= lower) & (values <= upper)
+
+
+@njit(cache=True)
+def _line_points(loc_x, loc_y, cos_a, sin_a, length, num_points):
+    """Sample a line; local Y is zero, so the rotation reduces to a broadcast."""
+    t_values = np.linspace(0.0, length, num_points)
+    points = np.empty((num_points, 2))
+    points[:, 0] = loc_x + t_values * cos_a
+    points[:, 1] = loc_y + t_values * sin_a
+    return points
+
+
+@njit(cache=True, fastmath=True)
+def _circle_points(loc_x, loc_y, cos_a, sin_a, radius, length, num_points):
+    """Sample a circular arc and rotate it into global coordinates."""
+    angles = np.linspace(0.0, abs(length) / radius, num_points)
+    local_x = radius * np.sin(angles)
+    # Negative length means the arc turns clockwise: mirror the local Y
+    local_y = np.sign(length) * radius * (1.0 - np.cos(angles))
+    points = np.empty((num_points, 2))
+    points[:, 0] = loc_x + local_x * cos_a - local_y * sin_a
+    points[:, 1] = loc_y + local_x * sin_a + local_y * cos_a
+    return points
+
+
+def _rdp_mask(points, epsilon):
+    """Ramer-Douglas-Peucker simplification; returns a mask of points to keep."""
+    n = len(points)
+    mask = np.zeros(n, dtype=bool)
+    if n < 3 or epsilon <= 0:
+        mask[:] = True
+        return mask
+    
+    mask[0] = mask[-1] = True
+    stack = [(0, n - 1)]
+    
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        
+        chord = points[end] - points[start]
+        rel = points[start + 1:end] - points[start]
+        chord_len2 = chord @ chord
+        
+        # Distance to the chord segment (also valid when start == end point)
+        t = np.clip(rel @ chord / chord_len2, 0.0, 1.0) if chord_len2 > 0 else np.zeros(len(rel))
+        dists = np.linalg.norm(rel - t[:, None] * chord, axis=1)
+        
+        idx = int(np.argmax(dists))
+        if dists[idx] > epsilon:
+            split = start + 1 + idx
+            mask[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    
+    return mask
 
 
 class AlignmentVisualizer:
     """Create interactive visualizations for IFC alignments."""
     
-    def __init__(self, filepath):
-        """Initialize with IFC file path."""
+    def __init__(self, filepath, ifc_file=None, mtime=None):
+        """Initialize with IFC file path, optionally reusing a parsed model.
+        
+        mtime is the modification time of the file version ifc_file was
+        parsed from; cache entries are keyed by it, not by the file on disk.
+        """
         self.filepath = filepath
-        self.ifc_file = ifcopenshell.open(filepath)
+        if ifc_file is None:
+            self.ifc_file, self.mtime = open_ifc(filepath)
+        else:
+            self.ifc_file = ifc_file
+            self.mtime = mtime if mtime is not None else os.path.getmtime(filepath)
     
-    def create_visualization(self, alignment_id, output_folder):
-        """Create complete visualization for an alignment."""
-        # Get the alignment
-        alignment = self.ifc_file.by_id(int(alignment_id))
-        
-        if not alignment or not alignment.is_a('IfcAlignment'):
-            raise ValueError(f"Alignment {alignment_id} not found or invalid")
-        
-        # Get representations
-        base_rep = None
-        gradient_rep = None
-        
-        for rep in alignment.Representation.Representations:
-            if rep.RepresentationType == 'Curve2D':
-                base_rep = rep
-            elif rep.RepresentationType == 'Curve3D':
-                gradient_rep = rep
-        
-        if not base_rep or not gradient_rep:
-            raise ValueError("Alignment missing base or gradient curve")
-        
-        base_curve = base_rep.Items[0]
-        gradient_curve = gradient_rep.Items[0]
-        
-        # Evaluate curves
-        base_points, base_distances = self._evaluate_base_curve(base_curve)
-        vert_distances, elevations = self._evaluate_vertical_profile(gradient_curve, base_distances[-1] if len(base_distances) > 0 else 1000)
-        
-        # Create 3D curve
-        base_elevations = np.interp(base_distances, vert_distances, elevations)
+    def create_visualization(self, alignment_id, output_folder, cache_folder=None, simplify_tolerance=0.1,
+                             executor=None):
+        """Create complete visualization for an alignment.
+        
+        When cache_folder is given, evaluated arrays and tables are stored
+        there and reused until the IFC file changes. The base curve sent to
+        the browser is simplified to within simplify_tolerance metres
+        (0 disables simplification); the cache keeps the full arrays.
+        When executor is given, the output files are written on it and the
+        returned 'write_future' completes once they are in place.
+        """
+        cache_key = self._cache_key(alignment_id)
+        cached = self._load_cache(cache_folder, cache_key) if cache_folder else None
+        
+        with _ifc_lock:
+            alignment, base_curve, gradient_curve = self._get_alignment_curves(alignment_id)
+            alignment_info = {
+                'id': alignment.id(),
+                'name': alignment.Name,
+                'global_id': alignment.GlobalId if hasattr(alignment, 'GlobalId') else "N/A",
+                'type': alignment.PredefinedType if hasattr(alignment, 'PredefinedType') else "N/A"
+            }
+            
+            # Walk the wrapped IFC segments once; every consumer reads these arrays
+            vert_segments = self._extract_segments(gradient_curve)
+            base_segments = None if cached else self._extract_segments(base_curve)
+        
+        if cached:
+            arrays, frames = cached
+            base_points, base_distances, vert_distances, elevations, base_elevations = (
+                arrays[name] for name in _CACHED_ARRAYS)
+            base_df, vert_df, summary_df = (frames[name] for name in _CACHED_FRAMES)
+        else:
+            # Evaluate curves
+            base_points, base_distances = self._evaluate_base_curve(base_segments)
+            vert_distances, elevations = self._evaluate_vertical_profile(vert_segments, base_distances[-1] if len(base_distances) > 0 else 1000)
+            
+            # Create 3D curve
+            base_elevations = _build_3d(base_distances, vert_distances, elevations)
+            
+            # Create analysis tables
+            base_df, vert_df, summary_df = self._create_analysis_tables(alignment_info, base_segments, vert_segments)
+            
+            if cache_folder:
+                self._save_cache(
+                    cache_folder, cache_key,
+                    dict(zip(_CACHED_ARRAYS, (base_points, base_distances, vert_distances, elevations, base_elevations))),
+                    dict(zip(_CACHED_FRAMES, (base_df, vert_df, summary_df)))
+                )
         
-        # Create analysis tables
-        base_df, vert_df, summary_df = self._create_analysis_tables(alignment, base_curve, gradient_curve)
+        # Decimate the base curve before it is serialized into the HTML
+        keep = _rdp_mask(np.column_stack([base_points, base_elevations]), simplify_tolerance)
+        base_points = base_points[keep]
+        base_distances = base_distances[keep]
+        base_elevations = base_elevations[keep]
         
         # Create visualization
         fig = self._create_plotly_figure(
-            base_points, base_distances, base_curve,
-            vert_distances, elevations, gradient_curve,
+            base_points, base_distances,
+            vert_distances, elevations, vert_segments,
             base_elevations,
             base_df, vert_df, summary_df,
-            alignment
+            alignment_info
         )
         
-        # Save HTML
-        html_filename = f"alignment_{alignment_id}_{alignment.Name.replace(' ', '_') if alignment.Name else 'unnamed'}.html"
+        # Save HTML shell and Arrow data. The filenames carry the content
+        # version, so each URL always serves the same bytes and is cacheable
+        name = alignment_info['name']
+        version = hashlib.sha1(f"{cache_key}:{simplify_tolerance}".encode()).hexdigest()
+        basename = f"alignment_{alignment_id}_{name.replace(' ', '_') if name else 'unnamed'}_{version[:12]}"
+        html_filename = f"{basename}.html"
+        data_filename = f"{basename}.arrow"
         html_path = os.path.join(output_folder, html_filename)
-        fig.write_html(html_path)
+        title = name if name else f"Alignment #{alignment_info['id']}"
+        write_args = (fig, title, html_path, os.path.join(output_folder, data_filename),
+                      f"/data/{quote(data_filename)}")
+        if executor is not None:
+            write_future = executor.submit(self._write_outputs, *write_args)
+        else:
+            self._write_outputs(*write_args)
+            write_future = None
         
         return {
             'html_filename': html_filename,
             'html_path': html_path,
+            'data_filename': data_filename,
+            'version': version,
             'summary': summary_df.to_dict('records'),
             'base_segments': base_df.to_dict('records'),
-            'vertical_segments': vert_df.to_dict('records')
+            'vertical_segments': vert_df.to_dict('records'),
+            'write_future': write_future
         }
     
-    def _evaluate_line_segment(self, placement, parent_curve, start, length, num_points=50):
-        """Evaluate points along a line segment."""
-        loc = placement.Location.Coordinates
-        if hasattr(placement, 'RefDirection') and placement.RefDirection:
-            ref_dir = placement.RefDirection.DirectionRatios
-        else:
-            ref_dir = (1.0, 0.0)
-        
-        t_values = np.linspace(0, length, num_points)
-        local_points = np.column_stack([t_values, np.zeros_like(t_values)])
+    def _get_alignment_curves(self, alignment_id):
+        """Get an alignment and its base (Curve2D) and gradient (Curve3D) curves."""
+        alignment = self.ifc_file.by_id(int(alignment_id))
         
-        cos_angle = ref_dir[0]
-        sin_angle = ref_dir[1]
+        if not alignment or not alignment.is_a('IfcAlignment'):
+            raise ValueError(f"Alignment {alignment_id} not found or invalid")
         
-        global_points = []
-        for pt in local_points:
-            x_global = loc[0] + pt[0] * cos_angle - pt[1] * sin_angle
-            y_global = loc[1] + pt[0] * sin_angle + pt[1] * cos_angle
-            global_points.append([x_global, y_global])
+        # Get representations
+        base_rep = None
+        gradient_rep = None
         
-        return np.array(global_points)
-    
-    def _evaluate_circle_segment(self, placement, parent_curve, start, length, num_points=50):
-        """Evaluate points along a circular arc segment."""
-        loc = placement.Location.Coordinates
-        if hasattr(placement, 'RefDirection') and placement.RefDirection:
-            ref_dir = placement.RefDirection.DirectionRatios
-        else:
-            ref_dir = (1.0, 0.0)
+        for rep in alignment.Representation.Representations:
+            if rep.RepresentationType == 'Curve2D':
+                base_rep = rep
+            elif rep.RepresentationType == 'Curve3D':
+                gradient_rep = rep
         
-        radius = parent_curve.Radius
-        total_angle = length / radius
-        angles = np.linspace(0, total_angle, num_points)
+        if not base_rep or not gradient_rep:
+            raise ValueError("Alignment missing base or gradient curve")
         
-        if length > 0:
-            local_points = np.column_stack([radius * np.sin(angles), radius * (1 - np.cos(angles))])
+        return alignment, base_rep.Items[0], gradient_rep.Items[0]
+    
+    def _write_outputs(self, fig, title, html_path, data_path, data_url):
+        """Write trace coordinates to an Arrow file and the figure to an HTML shell.
+        
+        Point traces are concatenated into x/y/z columns (z is NaN for 2D
+        traces); each trace records its row slice so the browser can attach
+        typed-array views instead of parsing inline JSON. Both files are
+        written under temporary names and moved into place, so concurrent
+        renders of one alignment never expose a partial file.
+        """
+        columns = {'x': [], 'y': [], 'z': []}
+        slices = []
+        offset = 0
+        
+        for idx, trace in enumerate(fig.data):
+            if trace.type not in _POINT_TRACE_TYPES:
+                continue
+            
+            fields = ['x', 'y', 'z'] if trace.type == 'scatter3d' else ['x', 'y']
+            count = len(trace.x)
+            for name in columns:
+                if name in fields:
+                    columns[name].append(np.asarray(trace[name], dtype=float))
+                else:
+                    columns[name].append(np.full(count, np.nan))
+            
+            # The 3D trace is coloured by its elevations, i.e. its z column
+            color = 'z' if trace.type == 'scatter3d' and trace.line.color is not None else None
+            slices.append({'trace': idx, 'start': offset, 'stop': offset + count,
+                           'fields': fields, 'color': color})
+            offset += count
+            
+            trace.update({name: [] for name in fields})
+            if color:
+                trace.line.color = None
+        
+        table = pa.table({name: np.concatenate(arrays) if arrays else np.empty(0)
+                          for name, arrays in columns.items()})
+        
+        # A single uncompressed batch keeps every column one contiguous buffer
+        sink = pa.BufferOutputStream()
+        feather.write_feather(table, sink, compression='uncompressed', chunksize=max(len(table), 1))
+        data = sink.getvalue()
+        reader = pa.ipc.open_file(data)
+        if reader.num_record_batches:
+            batch = reader.get_batch(0)
+            layout = {name: {'offset': batch.column(i).buffers()[1].address - data.address,
+                             'length': len(batch)}
+                      for i, name in enumerate(batch.schema.names)}
         else:
-            angles = np.linspace(0, -length / radius, num_points)
-            local_points = np.column_stack([radius * np.sin(angles), -radius * (1 - np.cos(angles))])
+            layout = {name: {'offset': 0, 'length': 0} for name in columns}
         
-        cos_angle = ref_dir[0]
-        sin_angle = ref_dir[1]
+        _write_atomic(data_path, lambda f: f.write(data))
         
-        global_points = []
-        for pt in local_points:
-            x_global = loc[0] + pt[0] * cos_angle - pt[1] * sin_angle
-            y_global = loc[1] + pt[0] * sin_angle + pt[1] * cos_angle
-            global_points.append([x_global, y_global])
+        content = _HTML_SHELL.substitute(
+            title=html.escape(title),
+            plotly_version=get_plotlyjs_version(),
+            figure_json=fig.to_json().replace('</', '<\\/'),
+            slices_json=json.dumps(slices),
+            layout_json=json.dumps(layout),
+            data_url=json.dumps(data_url)
+        )
+        _write_atomic(html_path, lambda f: f.write(content), mode='w', encoding='utf-8')
+    
+    def _cache_key(self, alignment_id):
+        """Build the cache key for an alignment of the parsed file version."""
+        raw = f"{_CACHE_VERSION}:{os.path.abspath(self.filepath)}:{self.mtime}:{alignment_id}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+    
+    def _load_cache(self, cache_folder, key):
+        """Load cached arrays and tables, or None on a cache miss."""
+        npz_path = os.path.join(cache_folder, f"{key}.npz")
+        if not os.path.exists(npz_path):
+            return None
+        
+        try:
+            with np.load(npz_path) as data:
+                arrays = {name: data[name] for name in _CACHED_ARRAYS}
+            frames = {
+                name: pd.read_parquet(os.path.join(cache_folder, f"{key}_{name}.parquet"))
+                for name in _CACHED_FRAMES
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        
+        return arrays, frames
+    
+    def _save_cache(self, cache_folder, key, arrays, frames):
+        """Store evaluated arrays (.npz) and tables (.parquet) for reuse."""
+        for name, df in frames.items():
+            _write_atomic(os.path.join(cache_folder, f"{key}_{name}.parquet"),
+                          lambda f, df=df: df.to_parquet(f, index=False))
+        
+        # The .npz marks a complete entry, so write it last
+        _write_atomic(os.path.join(cache_folder, f"{key}.npz"),
+                      lambda f: np.savez_compressed(f, **arrays))
+    
+    def _extract_segments(self, curve):
+        """Gather per-segment properties of a curve into arrays in one pass.
+        
+        Returns a dict of equal-length arrays: types (IFC class names),
+        lengths, starts, loc_x, loc_y, ref_dx, ref_dy, has_ref, radii (NaN
+        unless IfcCircle) and coeffs as (c0, c1, c2) rows (zero unless
+        IfcPolynomialCurve).
+        """
+        segments = curve.Segments
+        n = len(segments)
+        
+        types = []
+        lengths = np.empty(n)
+        starts = np.empty(n)
+        loc_x = np.empty(n)
+        loc_y = np.empty(n)
+        ref_dx = np.ones(n)
+        ref_dy = np.zeros(n)
+        has_ref = np.zeros(n, dtype=bool)
+        radii = np.full(n, np.nan)
+        coeffs = np.zeros((n, 3))
+        
+        for idx, segment in enumerate(segments):
+            placement = segment.Placement
+            parent = segment.ParentCurve
+            curve_type = parent.is_a()
+            
+            types.append(curve_type)
+            lengths[idx] = segment.SegmentLength.wrappedValue
+            starts[idx] = segment.SegmentStart.wrappedValue
+            loc = placement.Location.Coordinates
+            loc_x[idx] = loc[0]
+            loc_y[idx] = loc[1]
+            
+            if getattr(placement, 'RefDirection', None):
+                ref = placement.RefDirection.DirectionRatios
+                ref_dx[idx] = ref[0]
+                ref_dy[idx] = ref[1]
+                has_ref[idx] = True
+            
+            if curve_type == 'IfcCircle':
+                radii[idx] = parent.Radius
+            elif curve_type == 'IfcPolynomialCurve':
+                values = (parent.CoefficientsY or ())[:3]
+                coeffs[idx, :len(values)] = values
         
-        return np.array(global_points)
+        return {
+            'types': np.array(types, dtype=str),
+            'lengths': lengths,
+            'starts': starts,
+            'loc_x': loc_x,
+            'loc_y': loc_y,
+            'ref_dx': ref_dx,
+            'ref_dy': ref_dy,
+            'has_ref': has_ref,
+            'radii': radii,
+            'coeffs': coeffs
+        }
+    
+    def _evaluate_line_segment(self, loc, ref_dir, length, sampling_step=_SAMPLING_STEP):
+        """Evaluate points along a line segment, one sample per sampling_step."""
+        num_points = max(2, int(abs(length) / sampling_step) + 1)
+        return _line_points(float(loc[0]), float(loc[1]), float(ref_dir[0]), float(ref_dir[1]),
+                            float(length), num_points)
     
-    def _evaluate_base_curve(self, composite_curve):
+    def _evaluate_circle_segment(self, loc, ref_dir, radius, length,
+                                 angle_step=_ANGLE_STEP, sampling_step=_SAMPLING_STEP):
+        """Evaluate points along a circular arc segment.
+        
+        Tight arcs are sampled by turned angle, long gentle ones by length.
+        """
+        total_angle = abs(length) / radius
+        num_points = max(_MIN_CURVE_POINTS,
+                         int(total_angle / angle_step) + 1,
+                         int(abs(length) / sampling_step) + 1)
+        return _circle_points(float(loc[0]), float(loc[1]), float(ref_dir[0]), float(ref_dir[1]),
+                              float(radius), float(length), num_points)
+    
+    def _evaluate_base_curve(self, segments):
         """Evaluate all points along the base curve."""
-        all_points = []
-        distances = []
-        current_dist = 0.0
+        seg_arrays = []
         
-        for segment in composite_curve.Segments:
-            placement = segment.Placement
-            parent_curve = segment.ParentCurve
-            start = segment.SegmentStart.wrappedValue
-            length = segment.SegmentLength.wrappedValue
+        for idx, curve_type in enumerate(segments['types']):
+            loc = (segments['loc_x'][idx], segments['loc_y'][idx])
+            ref_dir = (segments['ref_dx'][idx], segments['ref_dy'][idx])
+            length = segments['lengths'][idx]
             
-            if parent_curve.is_a('IfcLine'):
-                points = self._evaluate_line_segment(placement, parent_curve, start, length)
-            elif parent_curve.is_a('IfcCircle'):
-                points = self._evaluate_circle_segment(placement, parent_curve, start, length)
+            if curve_type == 'IfcLine':
+                points = self._evaluate_line_segment(loc, ref_dir, length)
+            elif curve_type == 'IfcCircle':
+                points = self._evaluate_circle_segment(loc, ref_dir, segments['radii'][idx], length)
             else:
                 continue
             
-            if len(all_points) > 0:
+            if len(seg_arrays) > 0:
                 points = points[1:]
             
-            for pt in points:
-                all_points.append(pt)
-                if len(all_points) > 1:
-                    dx = pt[0] - all_points[-2][0]
-                    dy = pt[1] - all_points[-2][1]
-                    current_dist += np.sqrt(dx**2 + dy**2)
-                distances.append(current_dist)
-        
-        return np.array(all_points), np.array(distances)
+            seg_arrays.append(points)
+        
+        if not seg_arrays:
+            return np.array([]), np.array([])
+        
+        all_points = np.vstack(seg_arrays)
+        d = np.hypot(np.diff(all_points[:, 0]), np.diff(all_points[:, 1]))
+        distances = np.concatenate(([0.0], np.cumsum(d)))
+        
+        return all_points, distances
     
-    def _evaluate_vertical_profile(self, gradient_curve, max_distance):
+    def _evaluate_vertical_profile(self, segments, max_distance):
         """Evaluate elevation along the gradient curve."""
         distances = []
         elevations = []
         
-        for segment in gradient_curve.Segments:
-            placement = segment.Placement
-            parent_curve = segment.ParentCurve
-            start_param = segment.SegmentStart.wrappedValue
-            length = segment.SegmentLength.wrappedValue
+        for idx, curve_type in enumerate(segments['types']):
+            length = segments['lengths'][idx]
             
             if length == 0:
                 continue
             
-            seg_start_dist = placement.Location.Coordinates[0]
-            seg_start_elev = placement.Location.Coordinates[1]
+            seg_start_dist = segments['loc_x'][idx]
+            seg_start_elev = segments['loc_y'][idx]
             
-            if parent_curve.is_a('IfcLine'):
-                num_points = 50
-                t_values = np.linspace(0, length, num_points)
+            if curve_type == 'IfcLine':
+                # Elevation is linear in distance, so the end points are exact
+                t_values = np.array([0.0, length])
                 
-                for t in t_values:
-                    distances.append(seg_start_dist + t)
-                    elevations.append(seg_start_elev + t * placement.RefDirection.DirectionRatios[1] / placement.RefDirection.DirectionRatios[0])
+                distances.append(seg_start_dist + t_values)
+                elevations.append(seg_start_elev + t_values * (segments['ref_dy'][idx] / segments['ref_dx'][idx]))
             
-            elif parent_curve.is_a('IfcPolynomialCurve'):
-                coeffs = parent_curve.CoefficientsY
-                c0 = coeffs[0]
-                c1 = coeffs[1] if len(coeffs) > 1 else 0
-                c2 = coeffs[2] if len(coeffs) > 2 else 0
+            elif curve_type == 'IfcPolynomialCurve':
+                c0, c1, c2 = segments['coeffs'][idx]
                 
-                num_points = 100
+                # Chord error of a parabola sampled every h metres is |c2| * h^2 / 4
+                step = 2 * np.sqrt(_PROFILE_TOLERANCE / abs(c2)) if c2 != 0 else abs(length)
+                num_points = max(_MIN_CURVE_POINTS, int(np.ceil(abs(length) / step)) + 1)
                 u_values = np.linspace(0, length, num_points)
                 
                 is_civil3d = (abs(c0) > 1.0 or abs(c1) > 0.001)
                 
-                for u in u_values:
-                    if is_civil3d:
-                        distances.append(seg_start_dist + u)
-                        elevations.append(c0 + c1 * u + c2 * u * u)
-                    else:
-                        distances.append(seg_start_dist + u)
-                        elevations.append(seg_start_elev + c0 + c1 * u + c2 * u * u)
-        
-        return np.array(distances), np.array(elevations)
+                elev_arr = c0 + c1 * u_values + c2 * u_values * u_values
+                if not is_civil3d:
+                    elev_arr = seg_start_elev + elev_arr
+                
+                distances.append(seg_start_dist + u_values)
+                elevations.append(elev_arr)
+        
+        if not distances:
+            return np.array([]), np.array([])
+        
+        return np.concatenate(distances), np.concatenate(elevations)
     
-    def _create_analysis_tables(self, alignment, base_curve, gradient_curve):
-        """Create analysis tables."""
+    def _create_analysis_tables(self, alignment_info, base_segments, vert_segments):
+        """Create analysis tables.
+        
+        Numeric columns stay numeric; the Plotly tables format them.
+        """
         # Base Curve Table
-        base_data = []
-        for idx, segment in enumerate(base_curve.Segments):
-            parent = segment.ParentCurve
-            curve_type = parent.is_a().replace('Ifc', '')
-            length = segment.SegmentLength.wrappedValue
-            
-            extra = ""
-            if parent.is_a('IfcCircle'):
-                radius = parent.Radius
-                extra = f"R={radius:.1f}m"
-            
-            base_data.append({
-                'Seg': idx,
-                'Type': curve_type,
-                'Length': f"{length:.2f}",
-                'Details': extra
-            })
+        base_types = base_segments['types']
+        base_details = np.where(base_types == 'IfcCircle',
+                                np.char.mod("R=%.1fm", base_segments['radii']), "")
         
-        base_df = pd.DataFrame(base_data)
+        base_df = pd.DataFrame({
+            'Seg': np.arange(len(base_types)),
+            'Type': np.char.replace(base_types, 'Ifc', ''),
+            'Length': base_segments['lengths'],
+            'Details': base_details
+        })
         
         # Vertical Profile Table
-        vert_data = []
-        cumulative_dist = 0.0
+        vert_types = vert_segments['types']
+        lengths = vert_segments['lengths']
+        c0, c1, c2 = vert_segments['coeffs'].T
+        
+        is_civil3d = (np.abs(c0) > 1.0) | (np.abs(c1) > 0.001)
+        pattern = np.where(is_civil3d, "Civil3D", "IMX")
+        start_grad = c1 * 100
+        end_grad = (c1 + 2 * c2 * lengths) * 100
+        poly_details = np.char.add(
+            np.char.add(pattern, ", "),
+            np.char.add(np.char.mod("%.2f%%→", start_grad), np.char.mod("%.2f%%", end_grad))
+        )
         
-        for idx, segment in enumerate(gradient_curve.Segments):
-            parent = segment.ParentCurve
-            curve_type = parent.is_a().replace('Ifc', '')
-            length = segment.SegmentLength.wrappedValue
-            start_elev = segment.Placement.Location.Coordinates[1]
-            
-            extra = ""
-            if parent.is_a('IfcPolynomialCurve'):
-                coeffs = parent.CoefficientsY
-                c0 = coeffs[0]
-                c1 = coeffs[1] if len(coeffs) > 1 else 0
-                c2 = coeffs[2] if len(coeffs) > 2 else 0
-                
-                is_civil3d = (abs(c0) > 1.0 or abs(c1) > 0.001)
-                pattern = "Civil3D" if is_civil3d else "IMX"
-                
-                start_grad = c1 * 100
-                end_grad = (c1 + 2 * c2 * length) * 100
-                
-                extra = f"{pattern}, {start_grad:.2f}%→{end_grad:.2f}%"
-            elif parent.is_a('IfcLine'):
-                if hasattr(segment.Placement, 'RefDirection') and segment.Placement.RefDirection:
-                    ref = segment.Placement.RefDirection.DirectionRatios
-                    grad = (ref[1] / ref[0]) * 100 if ref[0] != 0 else 0
-                    extra = f"{grad:.2f}%"
-            
-            vert_data.append({
-                'Seg': idx,
-                'Type': curve_type,
-                'Distance': f"{cumulative_dist:.2f}",
-                'Length': f"{length:.2f}",
-                'Elevation': f"{start_elev:.2f}",
-                'Details': extra
-            })
-            
-            cumulative_dist += length
+        ref_dx = vert_segments['ref_dx']
+        line_grad = np.divide(vert_segments['ref_dy'] * 100, ref_dx,
+                              out=np.zeros_like(ref_dx), where=ref_dx != 0)
+        line_details = np.where(vert_segments['has_ref'], np.char.mod("%.2f%%", line_grad), "")
         
-        vert_df = pd.DataFrame(vert_data)
+        vert_details = np.where(vert_types == 'IfcPolynomialCurve', poly_details,
+                                np.where(vert_types == 'IfcLine', line_details, ""))
+        
+        cumulative = np.cumsum(lengths)
+        total_length = cumulative[-1] if len(cumulative) > 0 else 0.0
+        
+        vert_df = pd.DataFrame({
+            'Seg': np.arange(len(vert_types)),
+            'Type': np.char.replace(vert_types, 'Ifc', ''),
+            'Distance': cumulative - lengths,
+            'Length': lengths,
+            'Elevation': vert_segments['loc_y'],
+            'Details': vert_details
+        })
         
         # Summary Table
-        polynomial_count = sum(1 for s in gradient_curve.Segments if s.ParentCurve.is_a('IfcPolynomialCurve'))
+        polynomial_count = int(np.count_nonzero(vert_segments['types'] == 'IfcPolynomialCurve'))
         
         summary_data = {
             'Property': [
@@ -286,15 +648,15 @@ class AlignmentVisualizer:
                 'Pattern Detected'
             ],
             'Value': [
-                alignment.Name if alignment.Name else f"#{alignment.id()}",
-                f"#{alignment.id()}",
-                alignment.GlobalId if hasattr(alignment, 'GlobalId') else "N/A",
-                alignment.PredefinedType if hasattr(alignment, 'PredefinedType') else "N/A",
-                str(len(base_curve.Segments)),
-                str(len(gradient_curve.Segments)),
+                alignment_info['name'] if alignment_info['name'] else f"#{alignment_info['id']}",
+                f"#{alignment_info['id']}",
+                alignment_info['global_id'],
+                alignment_info['type'],
+                str(len(base_segments['types'])),
+                str(len(vert_segments['types'])),
                 str(polynomial_count),
-                f"{cumulative_dist:.2f} m",
-                vert_df['Elevation'].iloc[0] if len(vert_df) > 0 else 'N/A',
+                f"{total_length:.2f} m",
+                f"{vert_df['Elevation'].iloc[0]:.2f}" if len(vert_df) > 0 else 'N/A',
                 '🔴 Civil3D' if polynomial_count > 0 else '🟢 IMX/None'
             ]
         }
@@ -302,17 +664,26 @@ class AlignmentVisualizer:
         
         return base_df, vert_df, summary_df
     
-    def _create_plotly_figure(self, base_points, base_distances, base_curve,
-                              vert_distances, elevations, gradient_curve,
-                              base_elevations, base_df, vert_df, summary_df, alignment):
+    def _column_formats(self, df):
+        """Plotly table cell formats: two decimals for float columns."""
+        return ['.2f' if pd.api.types.is_float_dtype(dtype) else '' for dtype in df.dtypes]
+    
+    def _create_plotly_figure(self, base_points, base_distances,
+                              vert_distances, elevations, vert_segments,
+                              base_elevations, base_df, vert_df, summary_df, alignment_info):
         """Create the Plotly figure."""
+        base_webgl = len(base_points) > _WEBGL_POINT_THRESHOLD
+        vert_webgl = len(vert_distances) > _WEBGL_POINT_THRESHOLD
+        base_scatter = go.Scattergl if base_webgl else go.Scatter
+        vert_scatter = go.Scattergl if vert_webgl else go.Scatter
+        
         fig = make_subplots(
             rows=3, cols=2,
             row_heights=[0.4, 0.3, 0.3],
             column_widths=[0.7, 0.3],
             specs=[
-                [{'type': 'scatter'}, {'type': 'table'}],
-                [{'type': 'scatter'}, {'type': 'table'}],
+                [{'type': 'scattergl' if base_webgl else 'scatter'}, {'type': 'table'}],
+                [{'type': 'scattergl' if vert_webgl else 'scatter'}, {'type': 'table'}],
                 [{'type': 'scatter3d'}, {'type': 'table'}]
             ],
             subplot_titles=(
@@ -329,7 +700,7 @@ class AlignmentVisualizer:
         
         # 1. Base Curve
         fig.add_trace(
-            go.Scatter(
+            base_scatter(
                 x=base_points[:, 0],
                 y=base_points[:, 1],
                 mode='lines',
@@ -342,7 +713,7 @@ class AlignmentVisualizer:
         
         # 2. Vertical Profile
         fig.add_trace(
-            go.Scatter(
+            vert_scatter(
                 x=vert_distances,
                 y=elevations,
                 mode='lines',
@@ -354,24 +725,22 @@ class AlignmentVisualizer:
         )
         
         # Highlight polynomial sections
-        for segment in gradient_curve.Segments:
-            if segment.ParentCurve.is_a('IfcPolynomialCurve'):
-                start_dist = segment.Placement.Location.Coordinates[0]
-                length = segment.SegmentLength.wrappedValue
-                end_dist = start_dist + length
-                
-                mask = (vert_distances >= start_dist) & (vert_distances <= end_dist)
-                fig.add_trace(
-                    go.Scatter(
-                        x=vert_distances[mask],
-                        y=elevations[mask],
-                        mode='lines',
-                        name='Polynomial',
-                        line=dict(color='red', width=3),
-                        showlegend=False
-                    ),
-                    row=2, col=1
-                )
+        for idx in np.flatnonzero(vert_segments['types'] == 'IfcPolynomialCurve'):
+            start_dist = vert_segments['loc_x'][idx]
+            end_dist = start_dist + vert_segments['lengths'][idx]
+            
+            mask = _range_mask(vert_distances, float(start_dist), float(end_dist))
+            fig.add_trace(
+                vert_scatter(
+                    x=vert_distances[mask],
+                    y=elevations[mask],
+                    mode='lines',
+                    name='Polynomial',
+                    line=dict(color='red', width=3),
+                    showlegend=False
+                ),
+                row=2, col=1
+            )
         
         # 3. 3D Curve
         fig.add_trace(
@@ -408,6 +777,7 @@ class AlignmentVisualizer:
                            fill_color='lightblue', align='left',
                            font=dict(size=10)),
                 cells=dict(values=[base_df[col] for col in base_df.columns],
+                          format=self._column_formats(base_df),
                           fill_color='white', align='left',
                           font=dict(size=9), height=20)
             ),
@@ -421,6 +791,7 @@ class AlignmentVisualizer:
                            fill_color='lightgreen', align='left',
                            font=dict(size=9)),
                 cells=dict(values=[vert_df[col] for col in vert_df.columns],
+                          format=self._column_formats(vert_df),
                           fill_color='white', align='left',
                           font=dict(size=8), height=20)
             ),
@@ -433,9 +804,9 @@ class AlignmentVisualizer:
         fig.update_xaxes(title_text="Distance Along (m)", row=2, col=1)
         fig.update_yaxes(title_text="Elevation (m)", row=2, col=1)
         
-        alignment_name = alignment.Name if alignment.Name else f"Alignment #{alignment.id()}"
-        step_id = f"#{alignment.id()}"
-        global_id = alignment.GlobalId if hasattr(alignment, 'GlobalId') else "N/A"
+        alignment_name = alignment_info['name'] if alignment_info['name'] else f"Alignment #{alignment_info['id']}"
+        step_id = f"#{alignment_info['id']}"
+        global_id = alignment_info['global_id']
         
         fig.update_layout(
             title=dict(